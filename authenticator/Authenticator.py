@@ -1,16 +1,53 @@
 from token_store.TokenStore import TokenStore
 from config.Config import AUTH_JWT_SECRET, AUTH_JWT_ALGORITHM, AUTH_JWT_EXP_SECONDS
-from utils.util import sha256_hex, async_retry
-from utils.http_client import get_aiohttp_session
+from utils.util import sha256_hex, async_retry, next_jti
+from utils.hash import token_key
+from utils.circuit_breaker import CircuitBreaker
+from utils.singleflight import SingleFlight
 from typing import Dict, Any
-from exceptions import ProviderValidationError, DataError
+from exceptions import ProviderValidationError, ProviderUnavailableError, CircuitOpenError, DataError, TokenStoreError
 from social_media_adapter_functions import *
 from datastore.MongoDataStore import MongoDataStore
 from logger.Logger import LOG
-import uuid
 import jwt
+import orjson
 import time
 import secrets
+import hmac
+import hashlib
+import base64
+import asyncio
+from cachetools import TLRUCache
+
+# HMAC algorithms signed in-process with a pre-keyed template; others go through PyJWT
+_HMAC_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+# Provider name -> token validator adapter
+_PROVIDER_VALIDATORS = {
+    "facebook": validate_facebook_token,
+    "twitter": validate_twitter_token,
+}
+SUPPORTED_PROVIDERS = frozenset(_PROVIDER_VALIDATORS)
+
+# Transient provider failures get one retry: at most two PROVIDER_TIMEOUT-bounded attempts per login
+PROVIDER_RETRIES = 1
+
+# Max validation calls in flight per provider
+PROVIDER_CONCURRENCY = 64
+
+# Verified app-token claims are reused for at most this many seconds
+VERIFIED_TOKEN_CACHE_TTL = 30
+VERIFIED_TOKEN_CACHE_SIZE = 10_000
+
+# Provider validation results are reused from the token store for at most this many seconds
+VALIDATION_CACHE_TTL = 300
+
+def _verified_token_ttu(_key, claims: Dict[str, Any], now: float) -> float:
+    # A cached entry never outlives the token's own exp claim
+    return min(now + VERIFIED_TOKEN_CACHE_TTL, claims.get("exp", now))
 
 # ---------- Authenticator ----------
 
@@ -21,22 +58,101 @@ class Authenticator:
         self.jwt_secret = jwt_secret
         self.jwt_algo = jwt_algo
         self.jwt_exp_seconds = jwt_exp_seconds
-        self._session = get_aiohttp_session()
 
-    async def close(self):
-        await self._session.close()
+        # Key the HMAC once so each token only pays for copy() + update()
+        digestmod = _HMAC_DIGESTS.get(jwt_algo)
+        # HMAC secrets are encoded once here instead of inside every jwt.decode
+        self._jwt_key = jwt_secret.encode() if digestmod else jwt_secret
+        self._hmac_template = hmac.new(self._jwt_key, digestmod=digestmod) if digestmod else None
+        self._jwt_header_b64 = _b64url(orjson.dumps({"alg": jwt_algo, "typ": "JWT"}))
+
+        # One breaker per provider so an outage at one does not slow down the other
+        self._breakers = {
+            provider: CircuitBreaker(failure_threshold=5, recovery_time=30, failure_types=(ProviderUnavailableError,))
+            for provider in _PROVIDER_VALIDATORS
+        }
+
+        # Caps concurrent calls per provider, so a slow provider cannot starve the other;
+        # identical validations already in flight are shared
+        self._provider_sems = {provider: asyncio.Semaphore(PROVIDER_CONCURRENCY) for provider in _PROVIDER_VALIDATORS}
+        self._inflight = SingleFlight()
+
+        # Claims of recently verified app tokens, keyed by a token digest (raw tokens are never kept)
+        self._verified_tokens = TLRUCache(maxsize=VERIFIED_TOKEN_CACHE_SIZE, ttu=_verified_token_ttu, timer=time.time)
+
+    def _encode_app_token(self, claims: Dict[str, Any]) -> str:
+        """Encode claims as a compact JWS, signing HMAC algorithms with the cached key schedule."""
+        # Matches jwt.encode byte-for-byte only for ASCII claims: orjson writes other
+        # characters as raw UTF-8 where PyJWT escapes them (\uXXXX). Both verify the
+        # same, so never compare issued tokens for equality.
+        payload = orjson.dumps(claims)
+        if self._hmac_template is None:
+            return jwt.api_jws.encode(payload, self.jwt_secret, algorithm=self.jwt_algo)
+
+        signing_input = self._jwt_header_b64 + b"." + _b64url(payload)
+        mac = self._hmac_template.copy()
+        mac.update(signing_input)
+        return (signing_input + b"." + _b64url(mac.digest())).decode()
+
+    async def _validate_social_token(self, provider: str, validator, social_token: str) -> Dict[str, Any]:
+        """
+        Validate with the provider, coalescing concurrent requests for the same token
+        into a single lookup/provider call.
+        """
+        digest = token_key(social_token)
+        return await self._inflight.do(
+            (provider, digest),
+            lambda: self._cached_validation(provider, validator, social_token, digest),
+        )
+
+    async def _cached_validation(self, provider: str, validator, social_token: str, digest: bytes) -> Dict[str, Any]:
+        """
+        Reuse a recent validation of the same social token from the token store,
+        otherwise ask the provider and cache the result. Cache failures never fail auth.
+        """
+        cache_key = f"sv:{provider}:{digest.hex()}"
+        try:
+            cached = await self.token_store.get(cache_key)
+            if cached is not None:
+                return cached
+        except TokenStoreError as e:
+            LOG.warning("Validation cache lookup failed: %s", e)
+
+        info = await self._call_provider(provider, validator, social_token)
+
+        # Never cache past the social token's own expiry (0 / missing means no expiry)
+        ttl = VALIDATION_CACHE_TTL
+        expires_at = info.get("expires_at")
+        if isinstance(expires_at, int) and expires_at > 0:
+            ttl = min(ttl, expires_at - time.time_ns() // 1_000_000_000)
+        if ttl > 0:
+            try:
+                await self.token_store.set(cache_key, info, ttl_seconds=ttl)
+            except TokenStoreError as e:
+                LOG.warning("Validation cache write failed: %s", e)
+        return info
+
+    async def _call_provider(self, provider: str, validator, social_token: str) -> Dict[str, Any]:
+        async with self._provider_sems[provider]:
+            # Only transport/5xx failures are retried or count against the breaker;
+            # a rejected token fails on the first attempt
+            try:
+                return await self._breakers[provider].call(
+                    async_retry, validator, token=social_token,
+                    retries=PROVIDER_RETRIES, retry_on=(ProviderUnavailableError,)
+                )
+            except CircuitOpenError:
+                raise ProviderUnavailableError(f"{provider} currently unavailable")
 
     async def authenticate(self, provider: str, social_token: str) -> Dict[str, Any]:
         """
         Public entrypoint. Returns a dict with 'app_token' (JWT) and 'payload' (claims).
         """
         provider = provider.lower()
-        if provider == "facebook":
-            info = await async_retry(validate_facebook_token, token=social_token)
-        elif provider == "twitter":
-            info = await async_retry(validate_twitter_token, token=social_token)
-        else:
+        validator = _PROVIDER_VALIDATORS.get(provider)
+        if validator is None:
             raise ProviderValidationError(f"Unsupported provider: {provider}")
+        info = await self._validate_social_token(provider, validator, social_token)
 
         # info should include 'uid' (user id at provider) and optionally 'scopes', 'expires_at'
         uid = info.get("uid")
@@ -46,13 +162,16 @@ class Authenticator:
          # ---------------- MongoDB user insert/upsert ----------------
         name = info.get("name")
         email = info.get("email")
-        extra = {k: v for k, v in info.items() if k not in ("uid", "name", "email")}
+        extra = info.copy()
+        extra.pop("uid", None)
+        extra.pop("name", None)
+        extra.pop("email", None)
         user_doc = await self.mongo_store.upsert_user(provider, uid, name=name, email=email, extra=extra, social_token=social_token)
-        LOG.info(f"User upserted/verified in MongoDB: {user_doc.get('_id')}")
+        LOG.info("User upserted/verified in MongoDB: %s", user_doc.get('_id'))
 
         # Create app JWT
-        jti = str(uuid.uuid4())
-        now = int(time.time())
+        jti = next_jti()
+        now = time.time_ns() // 1_000_000_000
         exp = now + self.jwt_exp_seconds
         social_token_hash = sha256_hex(social_token)
 
@@ -68,16 +187,17 @@ class Authenticator:
             "st_hash": social_token_hash,
         }
 
-        app_token = jwt.encode(claims, self.jwt_secret, algorithm=self.jwt_algo)
+        app_token = self._encode_app_token(claims)
 
         # store mapping so we can revoke or validate server-side if needed
+        meta = {"name": name, "email": email, **extra}
         store_payload = {
             "provider": provider,
             "uid": uid,
             "st_hash": social_token_hash,
             "issued_at": now,
             "expires_at": exp,
-            "meta": {k: v for k, v in info.items() if k not in ("uid",)},
+            "meta": meta,
         }
 
         await self.token_store.set(jti, store_payload, ttl_seconds=self.jwt_exp_seconds)
@@ -85,19 +205,25 @@ class Authenticator:
         return {"app_token": app_token, "claims": claims}
     
     async def verify_app_token(self, token: str):
-        """Verify and decode the issued JWT app token."""
+        """Verify and decode the issued JWT app token. Recently verified tokens skip jwt.decode."""
+        cache_key = token_key(token)
+        cached = self._verified_tokens.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
             payload = jwt.decode(
                 token,
-                self.jwt_secret,
+                self._jwt_key,
                 algorithms=[self.jwt_algo]
             )
+            self._verified_tokens[cache_key] = payload
             return payload
         except jwt.ExpiredSignatureError:
             LOG.warning("Expired app token")
             return None
         except jwt.InvalidTokenError as e:
-            LOG.warning(f"Invalid app token: {e}")
+            LOG.warning("Invalid app token: %s", e)
             return None
         
     async def delete_user(self, provider: str, uid: str, jti: str):
@@ -121,12 +247,7 @@ class Authenticator:
         Also cleans up tokens if applicable.
         """
 
-        data = await self.mongo_store.get_user(provider=provider, social_id=user_id)
-
-        if not data:
-            raise DataError("User not found or already deleted")
-
-        # Delete from MongoDB
+        # Delete from MongoDB; deleted_count doubles as the existence check
         deleted = await self.mongo_store.delete_user(provider=provider, social_id=user_id)
         if not deleted:
             raise DataError("User not found or already deleted")
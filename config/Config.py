@@ -42,6 +42,8 @@ MONGO_URL: str = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME: str = os.getenv("MONGO_DB_NAME", "")
 USERS_COLLECTION: str = os.getenv("USERS_COLLECTION", "")
 DELETED_USERS_COLLECTION: str = os.getenv("DELETED_USERS_COLLECTION", "")
+# Wire protocol compression, in order of preference (negotiated with the server)
+MONGO_COMPRESSORS: str = os.getenv("MONGO_COMPRESSORS", "zstd,zlib")
 
 # ---------- Helper for Debug ----------
 def debug_print_config():
@@ -62,5 +64,6 @@ def debug_print_config():
     print(f"  DB_NAME = {mask(DB_NAME)}")
     print(f"  USERS_COLLECTION = {mask(USERS_COLLECTION)}")
     print(f"  DELETED_USERS_COLLECTION = {mask(DELETED_USERS_COLLECTION)}")
+    print(f"  MONGO_COMPRESSORS = {MONGO_COMPRESSORS}")
     print(f"  TWITTER_OAUTH2_ENABLE = {TWITTER_OAUTH2_ENABLE}")
     print(f"  SQLITE_PATH = {SQLITE_PATH}")
@@ -1,13 +1,23 @@
-from pymongo import ASCENDING
-from pymongo.errors import DuplicateKeyError, PyMongoError
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 from pymongo import AsyncMongoClient
+from cachetools import TTLCache
 from typing import Optional, Dict, Any
 from logger.Logger import LOG
-from config.Config import MONGO_URL, DB_NAME, USERS_COLLECTION, DELETED_USERS_COLLECTION
+from config.Config import MONGO_URL, DB_NAME, USERS_COLLECTION, DELETED_USERS_COLLECTION, MONGO_COMPRESSORS
 from exceptions.DataError import DataError
-import certifi
+from utils.http_client import CA_FILE
+from utils.mongo import normalize_mongo_doc
+import asyncio
+import contextlib
 from datetime import datetime, timezone
 
+# Max deletion records written per bulk_write by the background writer
+DELETION_BATCH_SIZE = 100
+# Full user documents kept per worker so bursts of /get_user skip the round trip
+USER_CACHE_SIZE = 5000
+USER_CACHE_TTL = 60
+
 
 class MongoDataStore:
     """
@@ -21,19 +31,60 @@ class MongoDataStore:
         self.db = None
         self.users = None
         self.deleted_users = None
+        self._deletion_queue: Optional[asyncio.Queue] = None
+        self._deletion_task: Optional[asyncio.Task] = None
+        self._user_cache: TTLCache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+        # Bumped by every user write; a read that raced a write does not fill the cache
+        self._user_writes = 0
 
     async def init(self):
-        self.client = AsyncMongoClient(self.mongo_url, tls=True, tlsCAFile=certifi.where())
+        self.client = AsyncMongoClient(
+            self.mongo_url,
+            tls=True,
+            tlsCAFile=CA_FILE,
+            compressors=MONGO_COMPRESSORS,
+        )
         self.db = self.client[self.db_name]
         self.users = self.db[self.collection_name]
         self.deleted_users = self.db[DELETED_USERS_COLLECTION]
 
-        # Ensure unique index for provider + social_id
+        # Ensure unique index for provider + social_id on both collections
         await self.users.create_index([("provider", ASCENDING), ("social_id", ASCENDING)], unique=True)
-        LOG.info(f"Connected to MongoDB, DB: {self.db_name}")
+        await self.deleted_users.create_index([("provider", ASCENDING), ("social_id", ASCENDING)], unique=True)
+        # Deletion status lookups go by confirmation code
+        await self.deleted_users.create_index([("confirmation_code", ASCENDING)])
+
+        self._deletion_queue = asyncio.Queue()
+        self._deletion_task = asyncio.create_task(self._deletion_writer())
+        LOG.info("Connected to MongoDB, DB: %s", self.db_name)
 
     async def get_user(self, provider: str, social_id: str) -> Optional[Dict[str, Any]]:
-        return await self.users.find_one({"provider": provider, "social_id": social_id})
+        """
+        Fetch a user by provider + social_id (served by the unique index).
+        Documents come back JSON-ready (ObjectIds as strings), normalized once as they
+        enter the short-lived in-process cache; treat them as read-only.
+        """
+        key = (provider, social_id)
+        user = self._user_cache.get(key)
+        if user is None:
+            writes = self._user_writes
+            user = await self.users.find_one({"provider": provider, "social_id": social_id})
+            if user is not None:
+                normalize_mongo_doc(user)
+                if writes == self._user_writes:
+                    self._user_cache[key] = user
+        return user
+
+    def _user_written(self, provider: str, social_id: str, user: Optional[Dict[str, Any]] = None):
+        """
+        Called once a user write has finished: cache the written document, or
+        evict the entry when there is none (delete, failed write).
+        """
+        self._user_writes += 1
+        if user is not None:
+            self._user_cache[(provider, social_id)] = normalize_mongo_doc(user)
+        else:
+            self._user_cache.pop((provider, social_id), None)
 
     async def upsert_user(
         self,
@@ -45,66 +96,56 @@ class MongoDataStore:
         extra: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
-        Insert user if not exists. 
-        If duplicate key found, compare with existing and update only changed fields.
+        Insert the user or update the stored fields in a single round trip.
+        Falls back to a plain update if a concurrent insert wins the race.
         """
-        doc = {
-            "provider": provider,
-            "social_id": social_id,
+        query = {"provider": provider, "social_id": social_id}
+        fields = {
             "social_token": social_token,
             "name": name or "",
             "email": email or "",
             "extra": extra or {},
         }
 
+        user = None
         try:
-            result = await self.users.insert_one(doc)
-            doc["_id"] = result.inserted_id
-            LOG.info(f"Inserted new user {social_id} ({provider})")
-            return doc
+            user = await self.users.find_one_and_update(
+                query,
+                {"$set": fields},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            LOG.info("Upserted user %s (%s)", social_id, provider)
+            return user
 
         except DuplicateKeyError:
+            # A concurrent first login inserted the user between the match and the upsert;
+            # the document exists now, so a plain update finishes the job.
             try:
-                # Fetch existing user
-                existing = await self.get_user(provider, social_id)
-                if not existing:
+                user = await self.users.find_one_and_update(
+                    query,
+                    {"$set": fields},
+                    return_document=ReturnDocument.AFTER,
+                )
+                if not user:
                     raise Exception("Duplicate key but user not found in DB")
-
-                # Determine changed fields
-                updates = {}
-                for key, value in doc.items():
-                    if key == "_id":
-                        continue
-                    # Compare dicts deeply for 'extra'
-                    if key == "extra":
-                        if existing.get("extra", {}) != value:
-                            updates[key] = value
-                    elif existing.get(key) != value:
-                        updates[key] = value
-
-                if updates:
-                    await self.users.update_one(
-                        {"provider": provider, "social_id": social_id},
-                        {"$set": updates}
-                    )
-                    LOG.info(f"Updated user {social_id} ({provider}) fields: {list(updates.keys())}")
-                    existing.update(updates)
-                else:
-                    LOG.info(f"No updates required for user {social_id} ({provider})")
-
-                return existing
+                LOG.info("Updated user %s (%s) after concurrent insert", social_id, provider)
+                return user
 
             except Exception as e:
-                LOG.error(f"Error updating existing user {social_id} ({provider}): {e}")
+                LOG.error("Error updating existing user %s (%s): %s", social_id, provider, e)
                 raise
 
         except PyMongoError as e:
-            LOG.error(f"Database error in upsert_user for {social_id} ({provider}): {e}")
+            LOG.error("Database error in upsert_user for %s (%s): %s", social_id, provider, e)
             raise Exception(f"Database operation failed: {str(e)}")
 
         except Exception as e:
-            LOG.error(f"Unexpected error in upsert_user for {social_id} ({provider}): {e}")
+            LOG.error("Unexpected error in upsert_user for %s (%s): %s", social_id, provider, e)
             raise Exception(f"Unexpected error: {str(e)}")
+
+        finally:
+            self._user_written(provider, social_id, user)
         
     async def delete_user(self, provider: str, social_id: str):
         try:
@@ -115,11 +156,14 @@ class MongoDataStore:
             return result.deleted_count > 0
         except Exception as e:
             raise DataError(f"Failed to delete user: {e}")
+        finally:
+            self._user_written(provider, social_id)
         
     async def upsert_deletion(self, provider: str, social_id: str, cnf: str, status: str):
         """
         Upsert a deletion request into the deleted_users collection.
-        Used for Facebook user deletion callback.
+        Used for Facebook user deletion callback. Writes are batched by
+        `_deletion_writer`; this call returns once its record is written.
 
         Schema:
         {
@@ -132,16 +176,6 @@ class MongoDataStore:
         """
 
         try:
-            # Lazily create collection reference if missing
-            if not hasattr(self, DELETED_USERS_COLLECTION) or self.deleted_users is None:
-                self.deleted_users = self.db[DELETED_USERS_COLLECTION]
-
-                # Ensure unique constraint
-                await self.deleted_users.create_index(
-                    [("provider", ASCENDING), ("social_id", ASCENDING)],
-                    unique=True
-                )
-
             doc = {
                 "provider": provider,
                 "social_id": social_id,
@@ -150,24 +184,23 @@ class MongoDataStore:
                 "timestamp": datetime.now(timezone.utc),
             }
 
-            await self.deleted_users.update_one(
-                {"provider": provider, "social_id": social_id},
-                {"$set": doc},
-                upsert=True
-            )
+            # Queued for the background writer; the future carries this record's outcome
+            done = asyncio.get_running_loop().create_future()
+            await self._deletion_queue.put((doc, done))
+            await done
 
-            LOG.info(f"Upserted deletion record for {provider}:{social_id}")
+            LOG.info("Upserted deletion record for %s:%s", provider, social_id)
 
         except DuplicateKeyError:
-            LOG.warning(f"Duplicate deletion record detected for {provider}:{social_id}")
+            LOG.warning("Duplicate deletion record detected for %s:%s", provider, social_id)
             raise DataError("A deletion record for this user already exists.")
 
         except PyMongoError as e:
-            LOG.error(f"Mongo error in upsert_deletion for {provider}:{social_id}: {e}")
+            LOG.error("Mongo error in upsert_deletion for %s:%s: %s", provider, social_id, e)
             raise DataError(f"Database error while saving deletion record: {e}")
 
         except Exception as e:
-            LOG.error(f"Unexpected error in upsert_deletion for {provider}:{social_id}: {e}")
+            LOG.error("Unexpected error in upsert_deletion for %s:%s: %s", provider, social_id, e)
             raise DataError(f"Unexpected error while saving deletion record: {e}")
         
     async def get_deleted_user(self, cnf: str) -> Optional[Dict[str, Any]]:
@@ -181,25 +214,76 @@ class MongoDataStore:
                 LOG.warning("get_deleted_user called with empty confirmation code")
                 return None
 
-            # Lazily init deleted_users collection
-            if not hasattr(self, DELETED_USERS_COLLECTION) or self.deleted_users is None:
-                self.deleted_users = self.db[DELETED_USERS_COLLECTION]
-
             doc = await self.deleted_users.find_one({"confirmation_code": cnf})
 
             if not doc:
-                LOG.info(f"No deleted user found for cnf_code={cnf}")
+                LOG.info("No deleted user found for cnf_code=%s", cnf)
                 return None
 
             return doc
 
         except Exception as e:
-            LOG.exception(f"Error retrieving deleted user for cnf_code={cnf}: {e}")
+            LOG.exception("Error retrieving deleted user for cnf_code=%s: %s", cnf, e)
             return None
 
+    async def _deletion_writer(self):
+        """
+        Background task: drain queued deletion records into unordered bulk upserts.
+        Takes whatever has queued up (at most DELETION_BATCH_SIZE) without waiting,
+        so a lone record is written immediately and bursts share one round trip.
+        A None in the queue (put by close()) stops it once everything before it is written.
+        """
+        while True:
+            item = await self._deletion_queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < DELETION_BATCH_SIZE and not self._deletion_queue.empty():
+                item = self._deletion_queue.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._write_deletions(batch)
+            if stop:
+                return
+
+    async def _write_deletions(self, batch):
+        ops = [
+            UpdateOne({"provider": doc["provider"], "social_id": doc["social_id"]}, {"$set": doc}, upsert=True)
+            for doc, _ in batch
+        ]
+        errors = {}
+        try:
+            await self.deleted_users.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: every op without a write error was applied
+            for err in e.details.get("writeErrors", []):
+                error_cls = DuplicateKeyError if err.get("code") == 11000 else PyMongoError
+                errors[err["index"]] = error_cls(err.get("errmsg", "bulk write error"))
+        except Exception as e:
+            errors = {i: e for i in range(len(batch))}
+
+        for i, (_, done) in enumerate(batch):
+            if done.done():
+                continue
+            if i in errors:
+                done.set_exception(errors[i])
+            else:
+                done.set_result(None)
 
-    
     async def close(self):
+        if self._deletion_task:
+            # Let the writer drain the records already queued instead of dropping them
+            await self._deletion_queue.put(None)
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._deletion_task
+            # Anything queued after shutdown began can no longer be written
+            while not self._deletion_queue.empty():
+                item = self._deletion_queue.get_nowait()
+                if item is not None and not item[1].done():
+                    item[1].set_exception(PyMongoError("MongoDataStore closed before the deletion record was written"))
         if self.client:
-            self.client.close()
+            await self.client.close()
             LOG.info("Closed MongoDB connection")
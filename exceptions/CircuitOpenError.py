@@ -0,0 +1,2 @@
+class CircuitOpenError(Exception):
+    """Raised by CircuitBreaker.call while the circuit is open."""
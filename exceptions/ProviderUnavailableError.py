@@ -0,0 +1,4 @@
+from .ProviderValidationError import ProviderValidationError
+
+class ProviderUnavailableError(ProviderValidationError):
+    """Provider unreachable, timed out, throttled or answered with a server error."""
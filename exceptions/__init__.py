@@ -1,4 +1,6 @@
 from .AuthError import AuthError
 from .ProviderValidationError import ProviderValidationError
+from .ProviderUnavailableError import ProviderUnavailableError
 from.TokenStoreError import TokenStoreError
-from .DataError import DataError
\ No newline at end of file
+from .DataError import DataError
+from .CircuitOpenError import CircuitOpenError
\ No newline at end of file
@@ -38,17 +38,17 @@ from fastapi import FastAPI, HTTPException, Header, Body, Query
 from pydantic import BaseModel
 from contextlib import asynccontextmanager
 from fastapi import Request
-from fastapi.responses import JSONResponse
 
 import asyncio
-from utils import util
+from utils.http_client import close_aiohttp_session
+from utils.responses import OrjsonResponse
 
 from config.Config import REDIS_URL, debug_print_config
 from exceptions import *
 from logger.Logger import LOG
 from token_store.TokenStore import TokenStore
 from datastore.MongoDataStore import MongoDataStore
-from authenticator.Authenticator import Authenticator
+from authenticator.Authenticator import Authenticator, SUPPORTED_PROVIDERS
 
 # ---------- Request / Response Schemas ----------
 class AuthRequest(BaseModel):
@@ -69,6 +69,9 @@ class DeleteUserByIdRequest(BaseModel):
     
 async def init_services():
     global initialized
+    # Fast path: after startup this is a plain bool read, no lock round trip
+    if initialized:
+        return
     async with startup_lock:
         if not initialized:
             LOG.info("Initializing token store and authenticator...")
@@ -84,7 +87,7 @@ async def lifespan(app: FastAPI):
     yield
     # Shutdown: cleanup
     LOG.info("Shutting down services...")
-    await authenticator.close()
+    await close_aiohttp_session()
     await token_store.close()
     await mongo_store.close()
     
@@ -94,21 +97,21 @@ app = FastAPI(title="Simple Social Auth Service", lifespan=lifespan)
 # ---------- Handle exceptions ----------
 @app.exception_handler(ProviderValidationError)
 async def provider_validation_exception_handler(request: Request, exc: ProviderValidationError):
-    return JSONResponse(
+    return OrjsonResponse(
         status_code=401,
         content={"detail": f"Social provider validation failed: {str(exc)}"},
     )
 
 @app.exception_handler(TokenStoreError)
 async def token_store_exception_handler(request: Request, exc: TokenStoreError):
-    return JSONResponse(
+    return OrjsonResponse(
         status_code=500,
         content={"detail": f"Token store error: {str(exc)}"},
     )
 
 @app.exception_handler(DataError)
 async def data_exception_handler(request: Request, exc: DataError):
-    return JSONResponse(
+    return OrjsonResponse(
         status_code=400,
         content={"detail": f"Data error: {str(exc)}"},
     )
@@ -120,7 +123,7 @@ authenticator: Authenticator = Authenticator(token_store=token_store, mongo_stor
 startup_lock = asyncio.Lock()
 initialized = False
 
-@app.get("/health")
+@app.get("/health", response_class=OrjsonResponse)
 def health_check():
     return {"status": "success", "message": "service running"}
 
@@ -128,10 +131,9 @@ def health_check():
 @app.post("/authenticate", response_model=AuthResponse)
 async def authenticate(req: AuthRequest):
     """Authenticate a social token and issue app JWT."""
-    await init_services()  # ensure initialized
     provider = req.provider.lower()
     token = req.token.strip()
-    if provider not in ("facebook", "twitter"):
+    if provider not in SUPPORTED_PROVIDERS:
         raise HTTPException(status_code=400, detail="Invalid provider")
 
     if not token:
@@ -140,6 +142,9 @@ async def authenticate(req: AuthRequest):
     try:
         out = await authenticator.authenticate(provider, token)
         return AuthResponse(app_token=out["app_token"], claims=out["claims"])
+    except ProviderUnavailableError as pue:
+        LOG.warning(f"Provider unavailable: {pue}")
+        raise HTTPException(status_code=503, detail=f"Provider unavailable: {pue}")
     except ProviderValidationError as pve:
         LOG.warning(f"Provider validation failed: {pve}")
         raise HTTPException(status_code=401, detail=f"Validation failed: {pve}")
@@ -148,21 +153,20 @@ async def authenticate(req: AuthRequest):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 # ---------- Get user endpoint ----------
-@app.get("/get_user", response_model=AuthResponse)
+@app.get("/get_user")
 async def get_user(authorization: str = Header(None)):
     """
     Get user details associated with a valid app token.
     Requires Authorization header: Bearer <app_token>
     """
-    await init_services()
-
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
 
-    if not authorization.startswith("Bearer "):
+    scheme, _, app_token = authorization.partition(" ")
+    if scheme != "Bearer":
         raise HTTPException(status_code=401, detail="Invalid Authorization header format")
 
-    app_token = authorization.split(" ")[1].strip()
+    app_token = app_token.strip()
 
     if not app_token:
         raise HTTPException(status_code=401, detail="App token missing")
@@ -181,7 +185,9 @@ async def get_user(authorization: str = Header(None)):
         if not user_data:
             raise HTTPException(status_code=404, detail="User not found")
 
-        return AuthResponse(app_token=app_token, claims=util.normalize_mongo_doc(user_data))
+        # Built from trusted data (get_user returns it already normalized), so skip
+        # the pydantic model and encode it directly
+        return OrjsonResponse({"app_token": app_token, "claims": user_data})
 
     except TokenStoreError as tse:
         LOG.error(f"Token store error: {tse}")
@@ -190,7 +196,7 @@ async def get_user(authorization: str = Header(None)):
         LOG.exception(f"Error fetching user: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
     
-@app.delete("/delete_user")
+@app.delete("/delete_user", response_class=OrjsonResponse)
 async def delete_user(
     request: Request,
     authorization: str = Header(None),
@@ -200,15 +206,17 @@ async def delete_user(
     Delete a user based on their app token.
     Requires Authorization: Bearer <app_token>
     """
-    await init_services()
-
-    if not authorization or not authorization.startswith("Bearer "):
+    scheme, _, app_token = (authorization or "").partition(" ")
+    if scheme != "Bearer":
         raise HTTPException(status_code=401, detail="Invalid Authorization header")
 
     if not payload.confirm:
         raise HTTPException(status_code=400, detail="Deletion not confirmed")
 
-    app_token = authorization.split(" ")[1].strip()
+    app_token = app_token.strip()
+
+    if not app_token:
+        raise HTTPException(status_code=401, detail="App token missing")
 
     try:
         claims = await authenticator.verify_app_token(app_token)
@@ -229,7 +237,7 @@ async def delete_user(
         LOG.exception(f"Error deleting user: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
     
-@app.delete("/delete_user_by_id")
+@app.delete("/delete_user_by_id", response_class=OrjsonResponse)
 async def delete_user_by_id(
     request: Request,
     payload: DeleteUserByIdRequest = Body(...)
@@ -238,8 +246,6 @@ async def delete_user_by_id(
     Delete a user based on their user_id.
     Requires `confirm=True` in the request body.
     """
-    await init_services()
-
     if not payload.confirm:
         raise HTTPException(status_code=400, detail="Deletion not confirmed")
     
@@ -270,7 +276,7 @@ async def user_deletion_status(cnf_id: str = Query(..., description="Confirmatio
         deleted_user = await mongo_store.get_deleted_user(cnf=cnf_id)
 
         if deleted_user:
-            return JSONResponse(
+            return OrjsonResponse(
                 status_code=200,
                 content={
                     "status": "deleted",
@@ -279,7 +285,7 @@ async def user_deletion_status(cnf_id: str = Query(..., description="Confirmatio
             )
 
         # not found anywhere
-        return JSONResponse(
+        return OrjsonResponse(
             status_code=404,
             content={
                 "status": "not_found",
@@ -288,7 +294,7 @@ async def user_deletion_status(cnf_id: str = Query(..., description="Confirmatio
         )
 
     except Exception as e:
-        return JSONResponse(
+        return OrjsonResponse(
             status_code=500,
             content={
                 "status": "error",
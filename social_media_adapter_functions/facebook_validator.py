@@ -1,9 +1,39 @@
 from typing import Dict, Any, Optional
 from config.Config import FACEBOOK_APP_ID, FACEBOOK_APP_SECRET
 from logger.Logger import LOG
-from utils.http_client import get_aiohttp_session
-from exceptions import ProviderValidationError
+from utils.http_client import get_aiohttp_session, PROVIDER_TIMEOUT
+from exceptions import ProviderValidationError, ProviderUnavailableError
 import aiohttp
+import asyncio
+import orjson
+import hashlib
+import hmac
+
+# Both are constant for the process lifetime, so build them once at import
+APP_ACCESS_TOKEN: Optional[str] = (
+    f"{FACEBOOK_APP_ID}|{FACEBOOK_APP_SECRET}"
+    if FACEBOOK_APP_ID and FACEBOOK_APP_SECRET
+    else None
+)
+# Keyed once; appsecret_proof() copies it instead of re-keying per token
+_APPSECRET_HMAC = (
+    hmac.new(FACEBOOK_APP_SECRET.encode(), digestmod=hashlib.sha256)
+    if FACEBOOK_APP_SECRET
+    else None
+)
+
+
+def appsecret_proof(token: str) -> Optional[str]:
+    """
+    HMAC-SHA256 of a user access token keyed with the app secret.
+    Graph API calls that carry it cannot be replayed with a token stolen
+    from outside this app. Returns None when no app secret is configured.
+    """
+    if _APPSECRET_HMAC is None:
+        return None
+    mac = _APPSECRET_HMAC.copy()
+    mac.update(token.encode())
+    return mac.hexdigest()
 
 
 async def validate_facebook_token(
@@ -12,6 +42,9 @@ async def validate_facebook_token(
     """
     Validate a Facebook access token and fetch user info.
 
+    debug_token and /me only need the user token, so both requests run
+    concurrently; a debug_token failure takes precedence when both fail.
+
     Returns:
         {
             "uid": str,
@@ -22,69 +55,74 @@ async def validate_facebook_token(
             "raw": dict,
         }
     """
-    if not FACEBOOK_APP_ID or not FACEBOOK_APP_SECRET:
-        LOG.warning("FACEBOOK_APP_ID or SECRET not set; trying best-effort validation")
+    if session is None:
+        session = get_aiohttp_session()
 
-    # Build app access token if available
-    app_access_token = (
-        f"{FACEBOOK_APP_ID}|{FACEBOOK_APP_SECRET}"
-        if FACEBOOK_APP_ID and FACEBOOK_APP_SECRET
-        else None
+    info, user_data = await asyncio.gather(
+        debug_token(token, session=session),
+        get_user_info(token, session=session),
+        return_exceptions=True,
     )
+    if isinstance(info, BaseException):
+        raise info
+    if isinstance(user_data, BaseException):
+        raise user_data
+
+    uid = info.get("user_id") or info.get("uid")
+
+    return {
+        "uid": str(uid),
+        "name": user_data.get("name", ""),
+        "email": user_data.get("email", ""),
+        "expires_at": info.get("expires_at"),
+        "scopes": info.get("scopes"),
+        "raw": {"validation": info, "user": user_data},
+    }
+
+
+async def debug_token(
+    token: str, session: Optional[aiohttp.ClientSession] = None
+) -> Dict[str, Any]:
+    """
+    Check the token against Facebook's debug_token endpoint and return its `data` block.
+    """
+    if not FACEBOOK_APP_ID or not FACEBOOK_APP_SECRET:
+        LOG.warning("FACEBOOK_APP_ID or SECRET not set; trying best-effort validation")
 
     debug_url = "https://graph.facebook.com/debug_token"
     params = {"input_token": token}
-    if app_access_token:
-        params["access_token"] = app_access_token
-
-    timeout = aiohttp.ClientTimeout(total=10)
-    should_close = False
+    if APP_ACCESS_TOKEN:
+        params["access_token"] = APP_ACCESS_TOKEN
 
     if session is None:
         session = get_aiohttp_session()
-        should_close = True
 
     try:
-        # 1️⃣ Validate token
-        async with session.get(debug_url, params=params, timeout=timeout) as resp:
-            text = await resp.text()
+        async with session.get(debug_url, params=params, timeout=PROVIDER_TIMEOUT) as resp:
             if resp.status != 200:
+                text = await resp.text()
                 LOG.error(f"Facebook token debug failed: {resp.status}, {text}")
+                if resp.status >= 500 or resp.status == 429:
+                    raise ProviderUnavailableError(f"Facebook unavailable, status={resp.status}")
                 raise ProviderValidationError("Facebook validation failed")
 
-            data = await resp.json()
-
-        info = data.get("data")
-        if not info:
-            raise ProviderValidationError("Malformed Facebook response")
-
-        if not info.get("is_valid"):
-            raise ProviderValidationError("Facebook token invalid")
+            data = await resp.json(loads=orjson.loads)
 
-        if FACEBOOK_APP_ID and info.get("app_id") != FACEBOOK_APP_ID:
-            raise ProviderValidationError("Facebook token app_id mismatch")
-
-        uid = info.get("user_id") or info.get("uid")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        LOG.error(f"Facebook HTTP error: {str(e)}")
+        raise ProviderUnavailableError(f"Facebook HTTP error: {e}")
 
-        # 2️⃣ Fetch user info
-        user_data = await get_user_info(token, session=session)
+    info = data.get("data")
+    if not info:
+        raise ProviderValidationError("Malformed Facebook response")
 
-        return {
-            "uid": str(uid),
-            "name": user_data.get("name", ""),
-            "email": user_data.get("email", ""),
-            "expires_at": info.get("expires_at"),
-            "scopes": info.get("scopes"),
-            "raw": {"validation": info, "user": user_data},
-        }
+    if not info.get("is_valid"):
+        raise ProviderValidationError("Facebook token invalid")
 
-    except aiohttp.ClientError as e:
-        LOG.error(f"Facebook HTTP error: {str(e)}")
-        raise ProviderValidationError(f"Facebook HTTP error: {e}")
+    if FACEBOOK_APP_ID and info.get("app_id") != FACEBOOK_APP_ID:
+        raise ProviderValidationError("Facebook token app_id mismatch")
 
-    finally:
-        if should_close:
-            await session.close()
+    return info
 
 
 async def get_user_info(
@@ -95,28 +133,25 @@ async def get_user_info(
     """
     user_info_url = "https://graph.facebook.com/me"
     params = {"fields": "id,name,email", "access_token": token}
-
-    timeout = aiohttp.ClientTimeout(total=10)
-    should_close = False
+    proof = appsecret_proof(token)
+    if proof:
+        params["appsecret_proof"] = proof
 
     if session is None:
         session = get_aiohttp_session()
-        should_close = True
 
     try:
-        async with session.get(user_info_url, params=params, timeout=timeout) as resp:
-            text = await resp.text()
+        async with session.get(user_info_url, params=params, timeout=PROVIDER_TIMEOUT) as resp:
             if resp.status != 200:
+                text = await resp.text()
                 LOG.error(f"Facebook user info fetch failed: {resp.status}, {text}")
+                if resp.status >= 500 or resp.status == 429:
+                    raise ProviderUnavailableError(f"Facebook unavailable, status={resp.status}")
                 raise ProviderValidationError("Failed to fetch Facebook user info")
 
-            data = await resp.json()
+            data = await resp.json(loads=orjson.loads)
             return data
 
-    except aiohttp.ClientError as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         LOG.error(f"Facebook HTTP error: {str(e)}")
-        raise ProviderValidationError(f"Facebook HTTP error: {e}")
-
-    finally:
-        if should_close:
-            await session.close()
+        raise ProviderUnavailableError(f"Facebook HTTP error: {e}")
@@ -1,9 +1,11 @@
 from typing import Dict, Any, Optional
 from config.Config import TWITTER_OAUTH2_ENABLE
-from utils.http_client import get_aiohttp_session
+from utils.http_client import get_aiohttp_session, PROVIDER_TIMEOUT
 from logger.Logger import LOG
-from exceptions import ProviderValidationError
+from exceptions import ProviderValidationError, ProviderUnavailableError
 import aiohttp
+import asyncio
+import orjson
 
 
 async def validate_twitter_token(token: str, session: Optional[aiohttp.ClientSession] = None) -> Dict[str, Any]:
@@ -25,14 +27,9 @@ async def validate_twitter_token(token: str, session: Optional[aiohttp.ClientSes
     """
     params = ""
     headers = {"Authorization": f"Bearer {token}", "User-Agent": "auth-service/1.0"}
-    timeout = aiohttp.ClientTimeout(total=10)
-    should_close = False
 
     if session is None:
         session = get_aiohttp_session()
-        should_close = True
-        
-    print(TWITTER_OAUTH2_ENABLE)
 
     try:
         # OAuth2 / v2 endpoint
@@ -43,13 +40,15 @@ async def validate_twitter_token(token: str, session: Optional[aiohttp.ClientSes
             # Fallback v1.1 endpoint
             url = "https://api.twitter.com/1.1/account/verify_credentials.json"
 
-        async with session.get(url, headers=headers, timeout=timeout) as resp:
-            text = await resp.text()
+        async with session.get(url, headers=headers, timeout=PROVIDER_TIMEOUT) as resp:
             if resp.status != 200:
+                text = await resp.text()
                 LOG.error(f"Twitter token validation failed: {resp.status}, {text}")
+                if resp.status >= 500 or resp.status == 429:
+                    raise ProviderUnavailableError(f"Twitter unavailable, status={resp.status}")
                 raise ProviderValidationError(f"Twitter validation failed, status={resp.status}")
 
-            data = await resp.json()
+            data = await resp.json(loads=orjson.loads)
             # extract user id
             if TWITTER_OAUTH2_ENABLE:
                 user_data = data.get("data") if isinstance(data, dict) else None
@@ -73,10 +72,6 @@ async def validate_twitter_token(token: str, session: Optional[aiohttp.ClientSes
                     raise ProviderValidationError("Twitter response missing user ID")
                 
 
-    except aiohttp.ClientError as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         LOG.error(f"Twitter HTTP error: {str(e)}")
-        raise ProviderValidationError(f"Twitter HTTP error: {e}")
-
-    finally:
-        if should_close:
-            await session.close()
+        raise ProviderUnavailableError(f"Twitter HTTP error: {e}")
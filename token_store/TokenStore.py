@@ -1,19 +1,36 @@
 # token_store.py
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Set, Tuple
 from logger.Logger import LOG
 from config.Config import SQLITE_PATH
 import aiosqlite
-import json
+import orjson
 import time
-import certifi
+import asyncio
+import contextlib
 from exceptions import TokenStoreError
+from utils.http_client import CA_FILE
 
 try:
-    import valkey
+    import valkey.asyncio as valkey
     _HAS_VALKEY = True
 except ImportError:
     _HAS_VALKEY = False
 
+# SQLite write-behind: queued sets are committed together every
+# SQLITE_FLUSH_INTERVAL seconds, or as soon as SQLITE_FLUSH_BATCH are queued
+SQLITE_FLUSH_INTERVAL = 0.05
+SQLITE_FLUSH_BATCH = 100
+# Expired rows removed per transaction by cleanup_expired
+SQLITE_CLEANUP_BATCH = 1000
+# Seconds between background sweeps of expired SQLite rows
+SQLITE_CLEANUP_INTERVAL = 300
+
+def _user_index_key(payload: Dict[str, Any]) -> Optional[str]:
+    """Valkey set listing a user's token jtis, for payloads that carry provider + uid."""
+    provider, uid = payload.get("provider"), payload.get("uid")
+    if provider and uid:
+        return f"user:{provider}:{uid}"
+    return None
 
 class TokenStore:
     """
@@ -25,14 +42,26 @@ class TokenStore:
         self._kv = None
         self._sqlite_conn = None
         self._sqlite_initialized = False
+        # Valkey auto-pipeline: commands queued during the current loop tick
+        self._kv_pending: List[Tuple[str, tuple, dict, asyncio.Future]] = []
+        self._kv_flush_scheduled = False
+        self._kv_flushes: Set[asyncio.Task] = set()
+        # SQLite write-behind: jti -> (payload_json, expires_at) not yet committed
+        self._sqlite_pending: Dict[str, Tuple[str, int]] = {}
+        # All callers share one connection-level transaction: every SQLite
+        # write + commit (flushes, deletes, cleanups) runs under this lock
+        self._sqlite_lock = asyncio.Lock()
+        self._sqlite_has_writes = asyncio.Event()
+        self._sqlite_batch_full = asyncio.Event()
+        self._sqlite_writer_task: Optional[asyncio.Task] = None
+        self._sqlite_sweeper_task: Optional[asyncio.Task] = None
 
     async def init(self):
         if self.redis_url and _HAS_VALKEY:
             self._kv = valkey.from_url(
                 self.redis_url, 
                 db=0, 
-                decode_responses=True,
-                ssl_ca_certs=certifi.where()
+                ssl_ca_certs=CA_FILE
             )
             LOG.info(f"Connected to Valkey at {self.redis_url}")
         else:
@@ -40,11 +69,129 @@ class TokenStore:
             db_path = SQLITE_PATH
             self._sqlite_conn = await aiosqlite.connect(db_path)
             await self._init_sqlite()
+            self._sqlite_writer_task = asyncio.create_task(self._sqlite_writer())
+            self._sqlite_sweeper_task = asyncio.create_task(self._sqlite_sweeper())
             LOG.info(f"Using sqlite fallback at {db_path}")
 
+    # ---------------------------------------------------------------------
+    # VALKEY AUTO-PIPELINE
+    # ---------------------------------------------------------------------
+    async def _kv_call(self, command: str, *args, **kwargs):
+        """
+        Queue one Valkey command and wait for its reply. Every command queued
+        during the same event-loop tick goes out in one non-transactional
+        pipeline, so N concurrent requests share a single round trip.
+        """
+        loop = asyncio.get_running_loop()
+        reply = loop.create_future()
+        self._kv_pending.append((command, args, kwargs, reply))
+        if not self._kv_flush_scheduled:
+            self._kv_flush_scheduled = True
+            loop.call_soon(self._start_kv_flush)
+        return await reply
+
+    def _start_kv_flush(self):
+        self._kv_flush_scheduled = False
+        batch, self._kv_pending = self._kv_pending, []
+        task = asyncio.ensure_future(self._flush_kv(batch))
+        self._kv_flushes.add(task)
+        task.add_done_callback(self._kv_flushes.discard)
+
+    async def _flush_kv(self, batch):
+        try:
+            async with self._kv.pipeline(transaction=False) as pipe:
+                for command, args, kwargs, _ in batch:
+                    getattr(pipe, command)(*args, **kwargs)
+                results = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (*_, reply), result in zip(batch, results):
+            if reply.done():
+                continue
+            if isinstance(result, Exception):
+                reply.set_exception(result)
+            else:
+                reply.set_result(result)
+
+    # ---------------------------------------------------------------------
+    # SQLITE WRITE-BEHIND
+    # ---------------------------------------------------------------------
+    async def _sqlite_writer(self):
+        """
+        Background task: commit queued sets in one transaction per batch
+        instead of one fsync'd commit per token.
+        """
+        while True:
+            await self._sqlite_has_writes.wait()
+            try:
+                await asyncio.wait_for(self._sqlite_batch_full.wait(), SQLITE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            await self._flush_sqlite()
+
+    async def _flush_sqlite(self):
+        """Write queued sets; a failed batch is logged and stays queued for the writer's next round."""
+        async with self._sqlite_lock:
+            try:
+                await self._flush_sqlite_locked()
+            except Exception as e:
+                LOG.error(f"SQLite batched set failed, tokens re-queued: {str(e)}")
+
+    async def _flush_sqlite_locked(self, rows: Optional[Dict[str, Tuple[str, int]]] = None):
+        """
+        Commit queued sets, plus `rows` if given, in one executemany. Caller holds _sqlite_lock.
+        On failure the queued sets go back to the queue (newer sets win), `rows` do not,
+        and the error is raised.
+        """
+        if not self._sqlite_pending and not rows:
+            return
+        queued, self._sqlite_pending = self._sqlite_pending, {}
+        self._sqlite_has_writes.clear()
+        self._sqlite_batch_full.clear()
+        batch = {**queued, **rows} if rows else queued
+        try:
+            await self._sqlite_conn.executemany(
+                "REPLACE INTO tokens (jti, payload, expires_at) VALUES (?, ?, ?)",
+                [(jti, payload_json, expires_at) for jti, (payload_json, expires_at) in batch.items()]
+            )
+            await self._sqlite_conn.commit()
+        except BaseException as e:
+            # e.g. "database is locked" with several workers on one file. Re-queue
+            # before rolling back so get() keeps seeing these rows; on cancellation
+            # (shutdown) close() writes them again.
+            self._requeue(queued)
+            if isinstance(e, Exception):
+                with contextlib.suppress(Exception):
+                    await self._sqlite_conn.rollback()
+            raise
+
+    def _requeue(self, batch: Dict[str, Tuple[str, int]]):
+        for jti, row in batch.items():
+            self._sqlite_pending.setdefault(jti, row)
+        if self._sqlite_pending:
+            self._sqlite_has_writes.set()
+
+    async def _sqlite_sweeper(self):
+        """
+        Background task: get() only filters expired rows, so they are removed
+        here every SQLITE_CLEANUP_INTERVAL seconds.
+        """
+        while True:
+            await asyncio.sleep(SQLITE_CLEANUP_INTERVAL)
+            with contextlib.suppress(TokenStoreError):
+                # cleanup_expired logs its own failures; try again next interval
+                await self.cleanup_expired()
+
     async def _init_sqlite(self):
         if self._sqlite_initialized:
             return
+        # WAL + NORMAL sync: commits no longer fsync a rollback journal each time
+        await self._sqlite_conn.execute("PRAGMA journal_mode=WAL")
+        await self._sqlite_conn.execute("PRAGMA synchronous=NORMAL")
+        await self._sqlite_conn.execute("PRAGMA temp_store=MEMORY")
+        await self._sqlite_conn.execute("PRAGMA cache_size=-65536")  # 64 MiB page cache
+        await self._sqlite_conn.execute("PRAGMA mmap_size=268435456")
         await self._sqlite_conn.execute("""
             CREATE TABLE IF NOT EXISTS tokens (
                 jti TEXT PRIMARY KEY,
@@ -52,55 +199,101 @@ class TokenStore:
                 expires_at INTEGER
             )
         """)
+        # Expiry sweeps range-scan this index instead of the whole table
+        await self._sqlite_conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tokens_expires_at ON tokens (expires_at)"
+        )
         await self._sqlite_conn.commit()
         self._sqlite_initialized = True
 
+    def _kv_set_calls(self, jti: str, payload: Dict[str, Any], payload_json: bytes, ttl_seconds: int):
+        """
+        Valkey commands for one set: the value itself plus, for user tokens,
+        the jti added to the user's index set (kept alive as long as its newest token).
+        """
+        calls = [self._kv_call("set", jti, payload_json, ex=ttl_seconds)]
+        index_key = _user_index_key(payload)
+        if index_key:
+            calls.append(self._kv_call("sadd", index_key, jti))
+            calls.append(self._kv_call("expire", index_key, ttl_seconds))
+        return calls
+
     async def set(self, jti: str, payload: Dict[str, Any], ttl_seconds: int):
-        payload_json = json.dumps(payload)
+        # Valkey stores the orjson bytes as-is; SQLite keeps JSON text
+        payload_json = orjson.dumps(payload)
         expires_at = int(time.time()) + ttl_seconds
         if self._kv:
             try:
-                self._kv.set(jti, payload_json, ex=ttl_seconds)
+                await asyncio.gather(*self._kv_set_calls(jti, payload, payload_json, ttl_seconds))
                 return
             except Exception as e:
                 LOG.error(f"Valkey set failed: {str(e)}")
                 raise TokenStoreError(e)
         else:
+            # Committed by the write-behind task; reads see it immediately
+            self._sqlite_pending[jti] = (payload_json.decode(), expires_at)
+            self._sqlite_has_writes.set()
+            if len(self._sqlite_pending) >= SQLITE_FLUSH_BATCH:
+                self._sqlite_batch_full.set()
+
+    async def set_many(self, items: List[Tuple[str, Dict[str, Any], int]]):
+        """
+        Store several (jti, payload, ttl_seconds) entries at once.
+        Valkey: all SETs share one pipelined round trip.
+        SQLite: written with any queued sets in one executemany + commit;
+        raises TokenStoreError if they were not committed.
+        """
+        if not items:
+            return
+        if self._kv:
             try:
-                await self._sqlite_conn.execute(
-                    "REPLACE INTO tokens (jti, payload, expires_at) VALUES (?, ?, ?)",
-                    (jti, payload_json, expires_at)
-                )
-                await self._sqlite_conn.commit()
+                await asyncio.gather(*(
+                    call
+                    for jti, payload, ttl_seconds in items
+                    for call in self._kv_set_calls(jti, payload, orjson.dumps(payload), ttl_seconds)
+                ))
+                return
+            except Exception as e:
+                LOG.error(f"Valkey set_many failed: {str(e)}")
+                raise TokenStoreError(e)
+        else:
+            now = int(time.time())
+            rows = {
+                jti: (orjson.dumps(payload).decode(), now + ttl_seconds)
+                for jti, payload, ttl_seconds in items
+            }
+            try:
+                async with self._sqlite_lock:
+                    await self._flush_sqlite_locked(rows)
             except Exception as e:
-                LOG.error(f"SQLite set failed: {str(e)}")
+                LOG.error(f"SQLite set_many failed: {str(e)}")
                 raise TokenStoreError(e)
 
     async def get(self, jti: str) -> Optional[Dict[str, Any]]:
         if self._kv:
             try:
-                val = self._kv.get(jti)
+                val = await self._kv_call("get", jti)
                 if not val:
                     return None
-                return json.loads(val)
+                return orjson.loads(val)
             except Exception as e:
                 LOG.error(f"Valkey get failed: {str(e)}")
                 raise TokenStoreError(e)
         else:
+            now = int(time.time())
+            pending = self._sqlite_pending.get(jti)
+            if pending is not None:
+                payload_json, expires_at = pending
+                return orjson.loads(payload_json) if expires_at > now else None
+            # Expired rows are filtered here and left for cleanup_expired to delete
             cur = await self._sqlite_conn.execute(
-                "SELECT payload, expires_at FROM tokens WHERE jti = ?",
-                (jti,)
+                "SELECT payload FROM tokens WHERE jti = ? AND expires_at > ?",
+                (jti, now)
             )
             row = await cur.fetchone()
             if not row:
                 return None
-            payload_json, expires_at = row
-            if int(time.time()) > expires_at:
-                # expired; delete
-                await self._sqlite_conn.execute("DELETE FROM tokens WHERE jti = ?", (jti,))
-                await self._sqlite_conn.commit()
-                return None
-            return json.loads(payload_json)
+            return orjson.loads(row[0])
         
     # ---------------------------------------------------------------------
     # DELETE (single token)
@@ -111,20 +304,46 @@ class TokenStore:
         """
         if self._kv:
             try:
-                deleted = self._kv.delete(jti)
-                print(f"Deleted Key: {deleted}")
+                deleted = await self._kv_call("delete", jti)
+                LOG.debug("Deleted Valkey key %s -> %s", jti, deleted)
                 return
             except Exception as e:
                 LOG.error(f"Valkey delete failed: {str(e)}")
                 raise TokenStoreError(e)
 
         try:
-            await self._sqlite_conn.execute("DELETE FROM tokens WHERE jti = ?", (jti,))
-            await self._sqlite_conn.commit()
+            async with self._sqlite_lock:
+                self._sqlite_pending.pop(jti, None)
+                await self._sqlite_conn.execute("DELETE FROM tokens WHERE jti = ?", (jti,))
+                await self._sqlite_conn.commit()
         except Exception as e:
             LOG.error(f"SQLite delete failed: {str(e)}")
             raise TokenStoreError(e)
 
+    async def delete_many(self, jtis: List[str]):
+        """
+        Delete several tokens in one round trip (Valkey) or one transaction (SQLite).
+        """
+        if not jtis:
+            return
+        if self._kv:
+            try:
+                await self._kv_call("delete", *jtis)
+                return
+            except Exception as e:
+                LOG.error(f"Valkey delete_many failed: {str(e)}")
+                raise TokenStoreError(e)
+
+        try:
+            async with self._sqlite_lock:
+                for jti in jtis:
+                    self._sqlite_pending.pop(jti, None)
+                await self._sqlite_conn.executemany("DELETE FROM tokens WHERE jti = ?", [(jti,) for jti in jtis])
+                await self._sqlite_conn.commit()
+        except Exception as e:
+            LOG.error(f"SQLite delete_many failed: {str(e)}")
+            raise TokenStoreError(e)
+
     # ---------------------------------------------------------------------
     # CLEANUP EXPIRED (SQLite only)
     # ---------------------------------------------------------------------
@@ -137,12 +356,24 @@ class TokenStore:
             return  # Redis already handles TTL expiry
 
         try:
+            await self._flush_sqlite()
             now = int(time.time())
-            await self._sqlite_conn.execute(
-                "DELETE FROM tokens WHERE expires_at <= ?", (now,)
-            )
-            await self._sqlite_conn.commit()
-            LOG.info("SQLite token cleanup complete")
+            removed = 0
+            # Short transactions, releasing the lock and yielding in between, so
+            # queued writes are not held behind one long sweep
+            while True:
+                async with self._sqlite_lock:
+                    cur = await self._sqlite_conn.execute(
+                        "DELETE FROM tokens WHERE rowid IN "
+                        "(SELECT rowid FROM tokens WHERE expires_at <= ? LIMIT ?)",
+                        (now, SQLITE_CLEANUP_BATCH)
+                    )
+                    await self._sqlite_conn.commit()
+                removed += cur.rowcount
+                if cur.rowcount < SQLITE_CLEANUP_BATCH:
+                    break
+                await asyncio.sleep(0)
+            LOG.info(f"SQLite token cleanup complete, removed {removed} tokens")
         except Exception as e:
             LOG.error(f"SQLite cleanup failed: {str(e)}")
             raise TokenStoreError(e)
@@ -156,34 +387,49 @@ class TokenStore:
         Requires tokens to include provider + uid inside payload.
         """
         if self._kv:
-            # Valkey doesn't have scan cursor by default — add only if needed
-            return
+            # Tokens are listed in the user's index set, so no keyspace SCAN is needed
+            index_key = f"user:{provider}:{uid}"
+            try:
+                jtis = await self._kv_call("smembers", index_key)
+                await self._kv_call("delete", *jtis, index_key)
+                LOG.info(f"Cleaned up {len(jtis)} tokens for user {provider}:{uid}")
+                return
+            except Exception as e:
+                raise TokenStoreError(f"Cleanup user failed: {e}")
 
         try:
-            cur = await self._sqlite_conn.execute(
-                "SELECT jti, payload FROM tokens"
-            )
-            rows = await cur.fetchall()
-
-            to_delete = []
-            for jti, payload_json in rows:
-                try:
-                    data = json.loads(payload_json)
-                    if data.get("provider") == provider and data.get("uid") == uid:
-                        to_delete.append(jti)
-                except:
-                    pass
-
-            for jti in to_delete:
-                await self.delete(jti)
+            async with self._sqlite_lock:
+                # Queued tokens must be in the table for the DELETE to catch them
+                await self._flush_sqlite_locked()
+                # Filter inside SQLite (JSON1) instead of loading every payload into Python
+                cur = await self._sqlite_conn.execute(
+                    "DELETE FROM tokens WHERE json_extract(payload, '$.provider') = ? AND json_extract(payload, '$.uid') = ?",
+                    (provider, uid)
+                )
+                await self._sqlite_conn.commit()
 
-            LOG.info(f"Cleaned up {len(to_delete)} tokens for user {provider}:{uid}")
+            LOG.info(f"Cleaned up {cur.rowcount} tokens for user {provider}:{uid}")
 
         except Exception as e:
             raise TokenStoreError(f"Cleanup user failed: {e}")
 
     async def close(self):
         if self._kv:
-            self._kv.close()
+            await self._kv.aclose()
+        if self._sqlite_sweeper_task:
+            self._sqlite_sweeper_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._sqlite_sweeper_task
+        if self._sqlite_writer_task:
+            self._sqlite_writer_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._sqlite_writer_task
         if self._sqlite_conn:
-            await self._sqlite_conn.close()
+            async with self._sqlite_lock:
+                # Also commits a batch the cancelled writer may have left open
+                try:
+                    await self._flush_sqlite_locked()
+                    await self._sqlite_conn.commit()
+                except Exception as e:
+                    LOG.error(f"SQLite close: {len(self._sqlite_pending)} queued tokens could not be written: {str(e)}")
+                await self._sqlite_conn.close()
@@ -0,0 +1,46 @@
+# utils/circuit_breaker.py
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple, Type
+from exceptions import CircuitOpenError
+
+
+class CircuitBreaker:
+    """
+    Minimal async circuit breaker.
+
+    After `failure_threshold` consecutive failures of `failure_types` the circuit
+    opens and `call` fails fast with CircuitOpenError for `recovery_time` seconds.
+    Once that window passes calls go through again; the next failure re-opens it
+    immediately, the next success closes it.
+    """
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_time: float = 30.0,
+        failure_types: Tuple[Type[BaseException], ...] = (Exception,),
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.failure_types = failure_types
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None and time.monotonic() - self._opened_at < self.recovery_time
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        if self.is_open:
+            raise CircuitOpenError(f"Circuit open for {getattr(func, '__name__', func)}")
+
+        try:
+            result = await func(*args, **kwargs)
+        except self.failure_types:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            raise
+
+        self._failures = 0
+        self._opened_at = None
+        return result
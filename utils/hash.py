@@ -0,0 +1,10 @@
+# utils/hash.py
+import hashlib
+
+
+def token_key(token: str) -> bytes:
+    """
+    128-bit BLAKE2b digest of a token, for use as a cache key.
+    Faster than sha256 in CPython and keeps raw tokens out of cache keys.
+    """
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
@@ -4,22 +4,46 @@ import ssl
 import certifi
 from typing import Optional
 
+# CA bundle path and TLS context, resolved and parsed once per process
+CA_FILE = certifi.where()
+SSL_CONTEXT = ssl.create_default_context(cafile=CA_FILE)
 
-def get_aiohttp_session(timeout_seconds: int = 10, session: Optional[aiohttp.ClientSession] = None) -> aiohttp.ClientSession:
+# Per-request budget for social provider calls: fail a stalled connect or read
+# quickly instead of holding a pool slot for the whole request
+PROVIDER_TIMEOUT = aiohttp.ClientTimeout(total=5, sock_connect=1.5, sock_read=3)
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_aiohttp_session() -> aiohttp.ClientSession:
     """
-    Returns a configured aiohttp.ClientSession with SSL verification using certifi.
-    
-    Args:
-        timeout_seconds (int): Request timeout in seconds.
-        session (Optional[aiohttp.ClientSession]): If provided, returns it directly.
-    
+    Returns the process-wide aiohttp.ClientSession, creating it on first use.
+
+    The session owns a pooled keep-alive connector, so TLS connections to the
+    social providers stay warm across requests. Must be called from a running
+    event loop; close it once on shutdown with `close_aiohttp_session()`.
+
     Returns:
-        aiohttp.ClientSession: Async HTTP session ready to use.
+        aiohttp.ClientSession: Shared async HTTP session.
     """
-    if session:
-        return session  # reuse existing session
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            ssl=SSL_CONTEXT,
+            limit=200,
+            limit_per_host=64,
+            ttl_dns_cache=300,
+            keepalive_timeout=75,
+            enable_cleanup_closed=True,
+        )
+        timeout = aiohttp.ClientTimeout(total=5, connect=2)
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return _session
 
-    ssl_context = ssl.create_default_context(cafile=certifi.where())
-    timeout = aiohttp.ClientTimeout(total=timeout_seconds)
 
-    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=ssl_context), timeout=timeout)
+async def close_aiohttp_session():
+    """Close the shared session (application shutdown hook)."""
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
@@ -0,0 +1,28 @@
+# utils/mongo.py
+from bson import ObjectId
+
+
+def normalize_mongo_doc(doc, _type=type, _ObjectId=ObjectId, _dict=dict, _list=list, _str=str, _enumerate=enumerate):
+    """
+    Convert ObjectIds to strings, in place. Walks nested dicts/lists with an
+    explicit stack instead of rebuilding every level; returns `doc`.
+    The underscore defaults bind builtins as locals for the inner loop; don't pass them.
+    """
+    t = _type(doc)
+    if t is _ObjectId:
+        return _str(doc)
+    if t is not _dict and t is not _list:
+        return doc
+    stack = [doc]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        cur = pop()
+        items = cur.items() if _type(cur) is _dict else _enumerate(cur)
+        for k, v in items:
+            tv = _type(v)
+            if tv is _ObjectId:
+                cur[k] = _str(v)
+            elif tv is _dict or tv is _list:
+                push(v)
+    return doc
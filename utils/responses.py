@@ -0,0 +1,15 @@
+# utils/responses.py
+import orjson
+from typing import Any
+from fastapi.responses import JSONResponse
+
+
+class OrjsonResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson's C encoder instead of stdlib json.
+
+    Same behaviour as fastapi's ORJSONResponse, kept local because newer
+    FastAPI releases deprecate that class.
+    """
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,24 @@
+# utils/singleflight.py
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical async calls.
+
+    The first `do(key, fn)` for a key starts `fn()` as a task; callers arriving
+    with the same key while it runs await that same task instead of starting
+    their own. Waiters are shielded, so one cancelled caller does not cancel
+    the shared call. The key is released as soon as the call finishes.
+    """
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(fn())
+            self._calls[key] = call
+            call.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(call)
@@ -1,31 +1,50 @@
 import hashlib
-from bson import ObjectId
 from logger.Logger import LOG
 import asyncio
+import os
+import random
+import threading
+import uuid
+
+# JWT IDs are drawn from one os.urandom read per _JTI_POOL_SIZE tokens
+_JTI_POOL_SIZE = 256
+_jti_pool = b""
+_jti_offset = 0
+_jti_lock = threading.Lock()
 
 def sha256_hex(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
-async def async_retry(func, *args, retries=3, backoff_factor=0.5, **kwargs):
-    """Simple retry helper with exponential backoff."""
+def _reset_jti_pool():
+    global _jti_pool, _jti_offset
+    _jti_pool = b""
+    _jti_offset = 0
+
+# A forked worker must never hand out the parent's remaining random bytes
+os.register_at_fork(after_in_child=_reset_jti_pool)
+
+def next_jti() -> str:
+    """Return a random UUID4 string, batching the urandom syscall across calls."""
+    global _jti_pool, _jti_offset
+    with _jti_lock:
+        if _jti_offset >= len(_jti_pool):
+            _jti_pool = os.urandom(16 * _JTI_POOL_SIZE)
+            _jti_offset = 0
+        chunk = _jti_pool[_jti_offset:_jti_offset + 16]
+        _jti_offset += 16
+    return str(uuid.UUID(bytes=chunk, version=4))
+
+async def async_retry(func, *args, retries=3, backoff_factor=0.5, retry_on=(Exception,), **kwargs):
+    """Simple retry helper with jittered exponential backoff. Only exceptions in `retry_on` are retried."""
     attempt = 0
     while True:
         try:
             return await func(*args, **kwargs)
-        except Exception as e:
+        except retry_on as e:
             attempt += 1
             if attempt > retries:
                 raise
-            sleep = backoff_factor * (2 ** (attempt - 1))
-            LOG.warning(f"Transient error calling {func.__name__}: {str(e)} — retrying in {sleep}s (attempt {attempt})")
+            # Jittered so callers that failed together do not retry in lockstep
+            sleep = backoff_factor * (1 << (attempt - 1)) * random.uniform(0.5, 1.5)
+            LOG.warning("Transient error calling %s: %s — retrying in %.2fs (attempt %d)", func.__name__, e, sleep, attempt)
             await asyncio.sleep(sleep)
-
-def normalize_mongo_doc(doc):
-    """Convert ObjectIds and other non-JSON types to string."""
-    if isinstance(doc, list):
-        return [normalize_mongo_doc(x) for x in doc]
-    if isinstance(doc, dict):
-        return {k: normalize_mongo_doc(v) for k, v in doc.items()}
-    if isinstance(doc, ObjectId):
-        return str(doc)
-    return doc
\ No newline at end of file